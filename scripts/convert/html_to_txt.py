@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 """
-Batch HTML → TXT converter (Python stdlib only).
+Batch HTML → TXT converter (Python stdlib only; optional `selectolax` speedup).
 
 Features:
 - Safe HTML parsing (no regex) to extract readable plain text.
 - Preserves basic structure: paragraphs, headings, lists, line breaks, simple tables.
 - Skips non‑content tags: script, style, noscript.
 - Decodes entities and normalizes whitespace.
+- Uses the C `lexbor` parser from `selectolax` when installed; falls back to `html.parser`.
 
 Options:
 - Drop content of specific tags (default: sup, sub) via `--drop-tags`.
@@ -37,14 +38,23 @@ Usage examples:
 from __future__ import annotations
 
 import argparse
+import codecs
+import hashlib
+import io
+import mmap
+import multiprocessing
 import os
 import re
 import sys
 from pathlib import Path
 from dataclasses import dataclass
-from html import unescape
 from html.parser import HTMLParser
-from typing import List, Optional
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+try:  # optional: C-implemented HTML parser, much faster than html.parser
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover - depends on environment
+    LexborHTMLParser = None
 
 
 BLOCK_TAGS = {
@@ -70,22 +80,44 @@ SKIP_TAGS = {"script", "style", "noscript"}
 ANGLE_ARROW_TOKENS = {"<", ">", "<<", ">>", "<>", "«", "»", "‹", "›", "◀", "▶", "▲", "▼"}
 
 
-def _collapse_spaces(s: str) -> str:
-    # Collapse runs of whitespace to single spaces
-    return re.sub(r"\s+", " ", s)
+# Precompiled patterns used on hot paths
+# \s (str patterns) also matches NBSP and other Unicode spaces
+_RE_WS = re.compile(r"\s+")
+# Line prefix to drop: leading blanks, plus a verse number when a sentence starter follows
+_RE_LEADING_NUM = re.compile(r"\s*(?:\d{1,4}(?:[.)])?(?=\s+[A-Za-zÁÉÍÓÚÜÑáéíóúüñ¿¡\"“”'])\s*)?")
 
 
 @dataclass
 class AnchorCtx:
     href: Optional[str] = None
-    text_start_index: int = 0  # buffer length index when <a> starts
+    text_start_index: int = 0  # output offset when <a> starts
 
 
 class TextExtractor(HTMLParser):
+    __slots__ = (
+        "include_urls",
+        "_out",
+        "_tail",
+        "skip_depth",
+        "drop_depth",
+        "in_pre",
+        "list_level",
+        "cell_index",
+        "anchor_stack",
+        "drop_tags",
+        "strip_angle_buttons",
+        "_start_handlers",
+        "_end_handlers",
+    )
+
+    # Trailing characters remembered for boundary checks; enough for a paragraph break
+    TAIL_LEN = 2
+
     def __init__(self, include_urls: bool = False, drop_tags: Optional[List[str]] = None, strip_angle_buttons: bool = False):
         super().__init__(convert_charrefs=True)
         self.include_urls = include_urls
-        self.buf: List[str] = []
+        self._out = io.StringIO()
+        self._tail = ""
         self.skip_depth = 0
         self.drop_depth = 0
         self.in_pre = False
@@ -94,228 +126,416 @@ class TextExtractor(HTMLParser):
         self.anchor_stack: List[AnchorCtx] = []
         self.drop_tags = {t.lower() for t in (drop_tags or [])}
         self.strip_angle_buttons = strip_angle_buttons
+        # drop_tags is fixed per parser: fold it into private copies of the
+        # dispatch tables so tag events need no separate membership test
+        self._start_handlers = dict(_START_HANDLERS)
+        self._end_handlers = dict(_END_HANDLERS)
+        for t in self.drop_tags:
+            self._start_handlers[t] = TextExtractor._start_drop
+            self._end_handlers[t] = TextExtractor._end_drop
 
     # ---- helpers ----
     def _last_char(self) -> str:
-        if not self.buf:
-            return ""
-        last = self.buf[-1]
-        return last[-1] if last else ""
+        return self._tail[-1:]
 
     def _append(self, text: str):
         if not text:
             return
-        self.buf.append(text)
+        self._out.write(text)
+        # Slice text first so long nodes aren't copied just to keep the tail
+        self._tail = (self._tail + text[-self.TAIL_LEN:])[-self.TAIL_LEN:]
 
     def _space_if_needed(self):
         if self._last_char() not in ("", " ", "\n", "\t"):
-            self.buf.append(" ")
+            self._append(" ")
 
     def _ensure_newlines(self, n: int = 1):
-        # Ensure at least n trailing newlines
-        cur = 0
-        i = len(self.buf) - 1
-        while i >= 0 and cur < n:
-            chunk = self.buf[i]
-            j = len(chunk) - 1
-            while j >= 0 and cur < n and chunk[j] == "\n":
-                cur += 1
-                j -= 1
-            if cur >= n:
-                break
-            if j >= 0:
-                break
-            i -= 1
+        # Ensure at least n trailing newlines (n <= TAIL_LEN)
+        tail = self._tail
+        cur = len(tail) - len(tail.rstrip("\n"))
         if cur < n:
-            self.buf.append("\n" * (n - cur))
+            self._append("\n" * (n - cur))
+
+    def _anchor_text(self, start: int) -> str:
+        # Read back what was written since `start`; read() leaves the cursor at the end
+        self._out.seek(start)
+        return self._out.read()
 
     def _paragraph_break(self):
         # Separate blocks with a blank line
         self._ensure_newlines(2)
 
-    # ---- parser callbacks ----
-    def handle_starttag(self, tag: str, attrs):
-        if tag in SKIP_TAGS:
-            self.skip_depth += 1
-            return
+    # ---- tag handlers (dispatched through per-parser copies of _START_HANDLERS / _END_HANDLERS) ----
+    def _start_br(self, attrs):
+        self._ensure_newlines(1)
 
-        if self.skip_depth > 0:
-            return
+    def _start_block(self, attrs):
+        self._paragraph_break()
 
-        if tag in self.drop_tags:
-            self.drop_depth += 1
-            return
+    def _start_list(self, attrs):
+        self.list_level += 1
+        self._paragraph_break()
 
-        if tag == "br":
-            self._ensure_newlines(1)
-            return
+    def _start_li(self, attrs):
+        self._ensure_newlines(1)
+        indent = "  " * max(0, self.list_level - 1)
+        self._append(f"{indent}• ")
 
-        if tag in BLOCK_TAGS or tag in HEADING_TAGS:
-            self._paragraph_break()
+    def _start_tr(self, attrs):
+        self._ensure_newlines(1)
+        self.cell_index = 0
 
-        if tag in LIST_CONTAINER_TAGS:
-            self.list_level += 1
-            self._paragraph_break()
-            return
+    def _start_cell(self, attrs):
+        if self.cell_index > 0:
+            self._append("\t")
+        self.cell_index += 1
 
-        if tag == LIST_ITEM_TAG:
-            self._ensure_newlines(1)
-            indent = "  " * max(0, self.list_level - 1)
-            self._append(f"{indent}• ")
-            return
+    def _start_pre(self, attrs):
+        self._paragraph_break()
+        self.in_pre = True
 
-        if tag == TABLE_ROW_TAG:
-            self._ensure_newlines(1)
-            self.cell_index = 0
-            return
+    def _start_a(self, attrs):
+        href = None
+        for k, v in attrs:
+            if k.lower() == "href":
+                href = v
+                break
+        self.anchor_stack.append(AnchorCtx(href=href, text_start_index=self._out.tell()))
 
-        if tag in TABLE_CELL_TAGS:
-            if self.cell_index > 0:
-                self._append("\t")
-            self.cell_index += 1
-            return
+    def _start_drop(self, attrs):
+        self.drop_depth += 1
 
-        if tag == "pre":
-            self._paragraph_break()
-            self.in_pre = True
-            return
+    def _end_drop(self):
+        if self.drop_depth > 0:
+            self.drop_depth -= 1
 
-        if tag == "a":
-            href = None
-            for k, v in attrs:
-                if k.lower() == "href":
-                    href = v
-                    break
-            self.anchor_stack.append(AnchorCtx(href=href, text_start_index=len(self.buf)))
-            return
+    def _end_block(self):
+        self._paragraph_break()
 
-    def handle_endtag(self, tag: str):
-        if tag in SKIP_TAGS:
-            if self.skip_depth > 0:
-                self.skip_depth -= 1
-            return
+    def _end_list(self):
+        self.list_level = max(0, self.list_level - 1)
+        self._paragraph_break()
 
-        if self.skip_depth > 0:
-            return
+    def _end_li(self):
+        self._ensure_newlines(1)
 
-        if tag in self.drop_tags:
-            if self.drop_depth > 0:
-                self.drop_depth -= 1
-            return
+    def _end_tr(self):
+        self._ensure_newlines(1)
+        self.cell_index = 0
 
-        if tag in BLOCK_TAGS or tag in HEADING_TAGS:
-            self._paragraph_break()
-            return
+    def _end_pre(self):
+        self.in_pre = False
+        self._paragraph_break()
 
-        if tag in LIST_CONTAINER_TAGS:
-            self.list_level = max(0, self.list_level - 1)
-            self._paragraph_break()
+    def _end_a(self):
+        if not self.anchor_stack:
             return
+        ctx = self.anchor_stack.pop()
+        if self.include_urls and ctx.href:
+            # Check if anchor has visible text
+            anchor_text = self._anchor_text(ctx.text_start_index).strip()
+            if anchor_text:
+                self._append(f" ({ctx.href})")
 
-        if tag == LIST_ITEM_TAG:
-            self._ensure_newlines(1)
+    # ---- parser callbacks ----
+    def handle_starttag(self, tag: str, attrs, _skip=SKIP_TAGS):
+        if tag in _skip:
+            self.skip_depth += 1
             return
 
-        if tag == TABLE_ROW_TAG:
-            self._ensure_newlines(1)
-            self.cell_index = 0
+        if self.skip_depth > 0:
             return
 
-        if tag in TABLE_CELL_TAGS:
-            # nothing; tabs added at start
-            return
+        handler = self._start_handlers.get(tag)
+        if handler is not None:
+            handler(self, attrs)
 
-        if tag == "pre":
-            self.in_pre = False
-            self._paragraph_break()
+    def handle_endtag(self, tag: str, _skip=SKIP_TAGS):
+        if tag in _skip:
+            if self.skip_depth > 0:
+                self.skip_depth -= 1
             return
 
-        if tag == "a":
-            if not self.anchor_stack:
-                return
-            ctx = self.anchor_stack.pop()
-            if self.include_urls and ctx.href:
-                # Check if anchor has visible text
-                anchor_text = "".join(self.buf[ctx.text_start_index:]).strip()
-                if anchor_text:
-                    self._append(f" ({ctx.href})")
+        if self.skip_depth > 0:
             return
 
-    def handle_data(self, data: str):
+        handler = self._end_handlers.get(tag)
+        if handler is not None:
+            handler(self)
+
+    def handle_data(self, data: str, _ws=_RE_WS.sub):
         if self.skip_depth > 0 or self.drop_depth > 0:
             return
 
         if not data:
             return
 
+        append = self._append
         if self.in_pre:
             # Keep as-is
-            self._append(data)
+            append(data)
             return
 
-        # Normalize spaces for regular text nodes
-        text = _collapse_spaces(data)
-        text = text.replace("\xa0", " ")
+        # Normalize spaces (NBSP included) for regular text nodes in one pass
+        text = _ws(" ", data)
+        last = self._tail[-1:]
 
         # Avoid leading space at start of line
-        if self._last_char() in ("", "\n"):
-            text = text.lstrip()
-
-        if text:
+        if last in ("", "\n"):
+            if text[:1] == " ":
+                text = text[1:]
+        elif last not in (" ", "\t") and text[:1] != " ":
             # Ensure separation from previous word if needed
-            if self._last_char() not in ("", "\n", " ", "\t") and not text.startswith(" "):
-                self.buf.append(" ")
-            self._append(text)
-
-    def get_text(self) -> str:
-        out = "".join(self.buf)
-        out = unescape(out)
-        # Normalize lines: trim trailing spaces and collapse multiple blank lines
-        lines = [re.sub(r"[ \t]+$", "", ln) for ln in out.splitlines()]
-        # Collapse 3+ blank lines to a single blank line
-        cleaned: List[str] = []
-        blank = 0
-        for ln in lines:
-            if ln.strip():
-                cleaned.append(ln)
-                blank = 0
+            append(" ")
+
+        append(text)
+
+    def _logical_lines(self) -> Iterator[str]:
+        """Yield the buffer's str.splitlines() lines one at a time."""
+        text = self._out.getvalue()
+        find = text.find
+        start = 0
+        end = len(text)
+        while start < end:
+            nl = find("\n", start)
+            if nl < 0:
+                nl = end - 1
+            yield from text[start:nl + 1].splitlines()
+            start = nl + 1
+
+    def _iter_lines(self) -> Iterator[str]:
+        """Yield the cleaned output lines in one walk over the buffer.
+
+        Trailing spaces/tabs are trimmed, runs of blank (or whitespace-only)
+        lines collapse to one empty line, and the text as a whole is
+        stripped. A non-blank line is held back until the next one arrives,
+        so the last line can still get its trailing whitespace removed.
+        """
+        # Entities were already decoded by the parser (convert_charrefs=True)
+        pending: Optional[str] = None
+        blank = False
+        for ln in self._logical_lines():
+            ln = ln.rstrip(" \t")
+            if ln and not ln.isspace():
+                if pending is None:
+                    ln = ln.lstrip()
+                else:
+                    yield pending
+                    if blank:
+                        yield ""
+                pending = ln
+                blank = False
             else:
-                if blank == 0:
-                    cleaned.append("")
-                blank = 1
-        text = "\n".join(cleaned).strip()
+                blank = True
+        if pending is not None:
+            yield pending.rstrip()
 
+    def _final_lines(self) -> Iterator[str]:
+        lines = self._iter_lines()
         if self.strip_angle_buttons:
             # Remove standalone angle/arrow tokens that act like nav buttons
-            def strip_arrows_line(ln: str) -> str:
-                # Replace tokens consisting only of angle/arrow glyphs when separated by whitespace
-                def repl(m):
-                    token = m.group(0).strip()
-                    return "" if token in ANGLE_ARROW_TOKENS else token
+            lines = map(strip_arrows_line, lines)
+        return lines
+
+    def write_to(self, fp: BinaryIO):
+        """Stream the cleaned text to a binary file as UTF-8, line by line."""
+        write = fp.write
+        wrote = False
+        for ln in self._final_lines():
+            write(ln.encode("utf-8", errors="replace") + b"\n")
+            wrote = True
+        if not wrote:
+            write(b"\n")
+
+    def get_text(self) -> str:
+        return "\n".join(self._final_lines()) + "\n"
+
+
+# Tag → handler tables, built once; one dict lookup per tag event
+_START_HANDLERS = {
+    **{t: TextExtractor._start_block for t in BLOCK_TAGS | HEADING_TAGS},
+    **{t: TextExtractor._start_list for t in LIST_CONTAINER_TAGS},
+    **{t: TextExtractor._start_cell for t in TABLE_CELL_TAGS},
+    "br": TextExtractor._start_br,
+    LIST_ITEM_TAG: TextExtractor._start_li,
+    TABLE_ROW_TAG: TextExtractor._start_tr,
+    "pre": TextExtractor._start_pre,
+    "a": TextExtractor._start_a,
+}
+
+# Table cells need nothing on close: tabs are added when the next cell starts
+_END_HANDLERS = {
+    **{t: TextExtractor._end_block for t in BLOCK_TAGS | HEADING_TAGS},
+    **{t: TextExtractor._end_list for t in LIST_CONTAINER_TAGS},
+    LIST_ITEM_TAG: TextExtractor._end_li,
+    TABLE_ROW_TAG: TextExtractor._end_tr,
+    "pre": TextExtractor._end_pre,
+    "a": TextExtractor._end_a,
+}
+
 
-                # Surround with spaces to simplify boundary matching
-                s = f" {ln} "
-                # Replace multiple times to catch adjacent tokens
-                prev = None
-                while prev != s:
-                    prev = s
-                    s = re.sub(r"(?<=\s)([«»‹›◀▶▲▼]|[<>]{1,3}|<>) (?=\s)", repl, s)
-                    # Collapse any excessive spaces that may result
-                    s = re.sub(r"\s+", " ", s)
-                return s.strip()
+def _lexbor_to_text(html: str, include_urls: bool = False, drop_tags: Optional[List[str]] = None, strip_angle_buttons: bool = False) -> str:
+    """Parse with lexbor (C) and replay the tree into a TextExtractor.
 
-            text = "\n".join(strip_arrows_line(ln) for ln in text.splitlines())
+    Skip/drop tags are removed from the tree up front, so the extractor only
+    sees content nodes; formatting rules stay in one place.
 
-        return text + "\n"
+    Known difference from html.parser: lexbor drops the whitespace between
+    <html>/<head> elements. On pages starting with a BOM, that whitespace
+    otherwise survives as leading spaces after the BOM on the first
+    (title) line, so such lines differ in leading whitespace only.
+    """
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(sorted(SKIP_TAGS | {t.lower() for t in (drop_tags or [])}))
+    ext = TextExtractor(include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
+    root = tree.root
+    # Iterative walk: (node, leaving) pairs emulate start/end tag events
+    stack = [(root, False)] if root is not None else []
+    while stack:
+        node, leaving = stack.pop()
+        tag = node.tag
+        if leaving:
+            ext.handle_endtag(tag)
+            continue
+        if tag == "-text":
+            ext.handle_data(node.text_content or "")
+            continue
+        if not tag or tag[0] in "-!":
+            # comments, doctype and other non-element nodes
+            continue
+        # Only <a> reads attributes (href); skip building them for other elements
+        ext.handle_starttag(tag, node.attributes.items() if tag == "a" else ())
+        stack.append((node, True))
+        children = []
+        child = node.child
+        while child is not None:
+            children.append(child)
+            child = child.next
+        stack.extend((c, False) for c in reversed(children))
+    return ext.get_text()
+
+
+def strip_arrows_line(ln: str) -> str:
+    """Drop whitespace-separated tokens that are only angle/arrow glyphs.
+
+    Single linear pass; remaining tokens are re-joined with single spaces.
+    """
+    return " ".join(t for t in ln.split() if t not in ANGLE_ARROW_TOKENS)
 
 
 def html_to_text(html: str, include_urls: bool = False, drop_tags: Optional[List[str]] = None, strip_angle_buttons: bool = False) -> str:
+    if LexborHTMLParser is not None:
+        return _lexbor_to_text(html, include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
     parser = TextExtractor(include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
     parser.feed(html)
     parser.close()
     return parser.get_text()
 
 
+# Content-hash cache of converted small documents (repeated boilerplate
+# pages), bounded by the total characters of text it holds
+_TEXT_CACHE: Dict[tuple, str] = {}
+_TEXT_CACHE_MAX_CHARS = 1 << 20
+_text_cache_chars = 0
+
+
+def html_to_text_cached(
+    html: Union[str, bytes],
+    encoding: str = "utf-8",
+    include_urls: bool = False,
+    drop_tags: Optional[List[str]] = None,
+    strip_angle_buttons: bool = False,
+) -> str:
+    """html_to_text memoized on a blake2b digest of the input.
+
+    Meant for small documents. Bytes are decoded with `encoding` only on a
+    cache miss. The cache stops growing once it holds
+    _TEXT_CACHE_MAX_CHARS characters of text.
+    """
+    global _text_cache_chars
+    is_str = isinstance(html, str)
+    raw = html.encode("utf-8", errors="surrogatepass") if is_str else html
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    key = (digest, None if is_str else encoding, include_urls, tuple(drop_tags or ()), strip_angle_buttons)
+    cached = _TEXT_CACHE.get(key)
+    if cached is not None:
+        return cached
+    if not is_str:
+        html = html.decode(encoding, errors="replace")
+    text = html_to_text(html, include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
+    if _text_cache_chars + len(text) <= _TEXT_CACHE_MAX_CHARS:
+        _TEXT_CACHE[key] = text
+        _text_cache_chars += len(text)
+    return text
+
+
+def _stream_to_parser(mm: mmap.mmap, encoding: str, parser: TextExtractor, chunk_size: int):
+    """Decode `mm` chunk by chunk and feed it to parser.
+
+    Each feed stops right after the last '<' of the data decoded so far, so
+    a text run is never split across two handle_data calls (which would
+    insert a spurious space). Slicing the mmap copies one chunk into bytes;
+    unlike memoryview slices, those never keep the mapping pinned, so an
+    error raised mid-stream surfaces as itself rather than as a BufferError
+    when the mapping closes.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    carry = ""
+    for pos in range(0, len(mm), chunk_size):
+        chunk = carry + decoder.decode(mm[pos:pos + chunk_size])
+        cut = chunk.rfind("<") + 1
+        parser.feed(chunk[:cut])
+        carry = chunk[cut:]
+    parser.feed(carry + decoder.decode(b"", final=True))
+    parser.close()
+
+
+def html_file_to_text(
+    path: str,
+    encoding: str = "utf-8",
+    include_urls: bool = False,
+    drop_tags: Optional[List[str]] = None,
+    strip_angle_buttons: bool = False,
+    chunk_size: int = 65536,
+    out: Optional[BinaryIO] = None,
+) -> Optional[str]:
+    """Convert an HTML file.
+
+    Files smaller than `chunk_size` are read in one call and go through
+    html_to_text_cached. Larger files are not cached; they are
+    memory-mapped instead of copied into a bytes object. The lexbor backend
+    decodes the mapping in one go, since it needs the whole document. The
+    html.parser backend streams it in `chunk_size` pieces.
+
+    If `out` (a binary file) is given, the text is written there as UTF-8
+    and None is returned; streamed files then never build the full string.
+    """
+    kwargs = dict(include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
+    text = None
+    parser = None
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < chunk_size:
+            # mmap setup is not worth it for small files
+            text = html_to_text_cached(f.read(), encoding=encoding, **kwargs)
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if LexborHTMLParser is not None:
+                    # Large documents are not cached: retaining them would defeat the mapping
+                    text = html_to_text(str(mm, encoding, "replace"), **kwargs)
+                else:
+                    parser = TextExtractor(**kwargs)
+                    _stream_to_parser(mm, encoding, parser, chunk_size)
+    if parser is not None:
+        if out is None:
+            return parser.get_text()
+        parser.write_to(out)
+        return None
+    if out is None:
+        return text
+    out.write(text.encode("utf-8", errors="replace"))
+    return None
+
+
 def strip_leading_numbers(text: str) -> str:
     """Remove verse-like leading numbers at the start of lines.
 
@@ -327,58 +547,211 @@ def strip_leading_numbers(text: str) -> str:
     appears at line start and is followed by spaces then a typical sentence
     starter (letter, quote or Spanish inverted punctuation).
     """
-    pat = re.compile(r"^\s*\d{1,4}(?:[.)])?(?=\s+[A-Za-zÁÉÍÓÚÜÑáéíóúüñ¿¡\"“”'])")
-    out_lines: List[str] = []
-    for ln in text.splitlines():
-        ln2 = pat.sub("", ln, count=1)
-        ln2 = re.sub(r"^\s+", "", ln2)
-        out_lines.append(ln2)
-    return "\n".join(out_lines) + "\n"
+    match = _RE_LEADING_NUM.match
+    # One match per line, and only for lines that can carry a prefix at all
+    return "\n".join([
+        ln[match(ln).end():] if ln[:1].isspace() or ln[:1].isdigit() else ln
+        for ln in text.splitlines()
+    ]) + "\n"
 
 
-def discover_files(root: str, exts: List[str], recursive: bool) -> List[str]:
-    exts_norm = tuple(e.lower() if e.startswith(".") else f".{e.lower()}" for e in exts)
+def _scan_files(root: str, exts_norm: tuple, recursive: bool) -> List[str]:
+    """List files under root whose lowercased name ends with one of exts_norm.
+
+    Uses os.scandir so type checks come from the cached dirent instead of an
+    extra stat per file. Like os.walk, symlinked directories are not followed
+    and unreadable subdirectories are skipped.
+    """
     found: List[str] = []
-    if recursive:
-        for base, _, files in os.walk(root):
-            for fn in files:
-                if fn.lower().endswith(exts_norm):
-                    found.append(os.path.join(base, fn))
-    else:
-        for fn in os.listdir(root):
-            p = os.path.join(root, fn)
-            if os.path.isfile(p) and fn.lower().endswith(exts_norm):
-                found.append(p)
-    return sorted(found)
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            if d == root and not recursive:
+                raise
+            continue
+        with it:
+            for ent in it:
+                if ent.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(ent.path)
+                elif ent.is_file() and ent.name.lower().endswith(exts_norm):
+                    found.append(ent.path)
+    return found
+
+
+def _rel_prefix(root: str) -> str:
+    """Prefix shared by every path _scan_files returns for root.
+
+    Slicing it off replaces os.path.relpath (which normalizes both paths
+    and calls os.getcwd) in per-file loops.
+    """
+    return os.path.join(root, "")
+
+
+def discover_files(root: str, exts: List[str], recursive: bool) -> List[str]:
+    exts_norm = tuple("." + e.lower().lstrip(".") for e in exts)
+    return sorted(_scan_files(root, exts_norm, recursive))
 
 
 def collect_txt_files(root: str) -> List[str]:
     """Collect all .txt files under root, sorted by relative path."""
-    txts: List[str] = []
-    for base, _, files in os.walk(root):
-        for fn in files:
-            if fn.lower().endswith(".txt"):
-                txts.append(os.path.join(base, fn))
-    # sort by relative path for stable ordering
-    txts.sort(key=lambda p: os.path.relpath(p, root))
+    txts = _scan_files(root, (".txt",), recursive=True)
+    # All paths share the same root prefix, so this orders by relative path
+    txts.sort()
     return txts
 
 
+def _trailing_newlines(f: BinaryIO, size: int) -> int:
+    """Count newline bytes at the end of a binary file of the given size."""
+    count = 0
+    end = size
+    while end > 0:
+        start = max(0, end - 4096)
+        f.seek(start)
+        block = f.read(end - start)
+        stripped = len(block.rstrip(b"\n"))
+        count += len(block) - stripped
+        if stripped:
+            break
+        end = start
+    return count
+
+
+def _copy_bytes(src: BinaryIO, out: BinaryIO, count: int):
+    """Copy the first `count` bytes of src to the current end of out.
+
+    Uses os.sendfile (kernel-to-kernel, no userspace copy) where available
+    and falls back to a buffered read/write loop.
+    """
+    out.flush()
+    offset = 0
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < count:
+                sent = os.sendfile(out.fileno(), src.fileno(), offset, count - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            pass
+    src.seek(offset)
+    remaining = count - offset
+    while remaining > 0:
+        buf = src.read(min(remaining, 1 << 20))
+        if not buf:
+            break
+        out.write(buf)
+        remaining -= len(buf)
+
+
 def merge_txt_files(src_root: str, dest_file: str, include_headers: bool = True, strip_numbers: bool = False):
-    files = collect_txt_files(src_root)
+    dest_abs = os.path.abspath(dest_file)
+    # The merged file may live under src_root (e.g. <output_dir>/all.txt); never merge it into itself
+    files = [fp for fp in collect_txt_files(src_root) if os.path.abspath(fp) != dest_abs]
+    prefix = _rel_prefix(src_root)
     os.makedirs(os.path.dirname(dest_file), exist_ok=True)
-    with open(dest_file, "w", encoding="utf-8") as out:
+    with open(dest_file, "wb") as out:
         for i, fp in enumerate(files):
-            rel = os.path.relpath(fp, src_root)
+            assert fp.startswith(prefix), fp
+            rel = fp[len(prefix):]
             if include_headers:
-                out.write(f"===== {rel} =====\n")
-            with open(fp, "r", encoding="utf-8", errors="replace") as f:
-                chunk = f.read()
+                out.write(f"===== {rel} =====\n".encode("utf-8", errors="replace"))
+            with open(fp, "rb") as f:
                 if strip_numbers:
-                    chunk = strip_leading_numbers(chunk)
-                out.write(chunk.rstrip("\n") + "\n")
+                    chunk = strip_leading_numbers(f.read().decode("utf-8", errors="replace"))
+                    out.write((chunk.rstrip("\n") + "\n").encode("utf-8", errors="replace"))
+                else:
+                    # Fast path: copy the bytes as-is, minus trailing newlines
+                    size = os.fstat(f.fileno()).st_size
+                    _copy_bytes(f, out, size - _trailing_newlines(f, size))
+                    out.write(b"\n")
             if i != len(files) - 1:
-                out.write("\n")
+                out.write(b"\n")
+
+
+def _pool_chunksize(n_tasks: int, workers: int) -> int:
+    # Amortize IPC pickling: roughly 4 chunks per worker
+    return max(1, n_tasks // (workers * 4))
+
+
+# Conversion options for the current process; set once per worker by _init_worker
+_WORKER_OPTS: dict = {}
+
+
+def _init_worker(opts: dict):
+    global _WORKER_OPTS
+    _WORKER_OPTS = dict(opts, rel_prefix=_rel_prefix(opts["input_dir"]))
+
+
+def _convert_one(task):
+    """Convert one HTML file using the options installed by _init_worker.
+
+    Takes (index, src) and returns (index, rel, text_or_None, err). When an
+    output directory is configured, the text is written there and None is
+    returned in its place.
+    """
+    idx, src = task
+    opts = _WORKER_OPTS
+    prefix = opts["rel_prefix"]
+    assert src.startswith(prefix), src
+    rel = src[len(prefix):]
+    convert_kwargs = dict(
+        encoding=opts["encoding"],
+        include_urls=opts["include_urls"],
+        drop_tags=opts["drop_tags"],
+        strip_angle_buttons=opts["strip_angle_buttons"],
+    )
+    try:
+        output_dir = opts["output_dir"]
+        if output_dir is None:
+            text = html_file_to_text(src, **convert_kwargs)
+            if opts["strip_numbers"]:
+                text = strip_leading_numbers(text)
+            return idx, rel, text, None
+        rel_noext = os.path.splitext(rel)[0]
+        dst = os.path.join(output_dir, rel_noext + ".txt")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if opts["strip_numbers"]:
+            text = strip_leading_numbers(html_file_to_text(src, **convert_kwargs))
+            with open(dst, "wb") as f:
+                f.write(text.encode("utf-8", errors="replace"))
+        else:
+            # Write straight from the extractor, without an intermediate str
+            try:
+                with open(dst, "wb") as f:
+                    html_file_to_text(src, out=f, **convert_kwargs)
+            except Exception:
+                # Don't leave a partial output behind
+                if os.path.exists(dst):
+                    os.remove(dst)
+                raise
+        return idx, rel, None, None
+    except Exception as e:
+        return idx, rel, None, str(e)
+
+
+def _run_pool(files: List[str], opts: dict, workers: Optional[int], ordered: bool = False):
+    """Yield _convert_one results for files, in a process pool when it pays off.
+
+    Options are shipped once per worker through the pool initializer, so each
+    task only pickles (index, path). With ordered=True results come back in
+    input order and can be streamed straight to a merged file.
+    """
+    tasks = list(enumerate(files))
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        _init_worker(opts)
+        for t in tasks:
+            yield _convert_one(t)
+        return
+    workers = min(workers, len(tasks))
+    chunksize = _pool_chunksize(len(tasks), workers)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(opts,)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(_convert_one, tasks, chunksize=chunksize)
 
 
 def process_to_single(
@@ -392,35 +765,35 @@ def process_to_single(
     exts: List[str],
     include_headers: bool = True,
     strip_numbers: bool = False,
+    workers: Optional[int] = None,
 ):
     files = discover_files(input_dir, exts, recursive)
     if not files:
         print("No HTML files found.")
         return 0
     os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+    opts = dict(
+        input_dir=input_dir,
+        include_urls=include_urls,
+        drop_tags=drop_tags,
+        strip_angle_buttons=strip_angle_buttons,
+        encoding=encoding,
+        strip_numbers=strip_numbers,
+        output_dir=None,
+    )
     processed = 0
-    with open(dest_file, "w", encoding="utf-8") as out:
-        for i, src in enumerate(files):
-            rel = os.path.relpath(src, input_dir)
+    with open(dest_file, "wb") as out:
+        # Ordered results: each text is written as soon as its turn comes up
+        for i, rel, text, err in _run_pool(files, opts, workers, ordered=True):
             if include_headers:
-                out.write(f"===== {rel} =====\n")
-            try:
-                with open(src, "r", encoding=encoding, errors="replace") as f:
-                    html = f.read()
-                text = html_to_text(
-                    html,
-                    include_urls=include_urls,
-                    drop_tags=drop_tags,
-                    strip_angle_buttons=strip_angle_buttons,
-                )
-                if strip_numbers:
-                    text = strip_leading_numbers(text)
-                out.write(text.rstrip("\n") + "\n")
-                if i != len(files) - 1:
-                    out.write("\n")
-                processed += 1
-            except Exception as e:
-                print(f"Error processing {src}: {e}", file=sys.stderr)
+                out.write(f"===== {rel} =====\n".encode("utf-8", errors="replace"))
+            if err is not None:
+                print(f"Error processing {files[i]}: {err}", file=sys.stderr)
+                continue
+            out.write((text.rstrip("\n") + "\n").encode("utf-8", errors="replace"))
+            if i != len(files) - 1:
+                out.write(b"\n")
+            processed += 1
     return processed
 
 
@@ -472,29 +845,42 @@ def process_all(
     recursive: bool,
     exts: List[str],
     strip_numbers: bool = False,
+    workers: Optional[int] = None,
 ) -> int:
     files = discover_files(input_dir, exts, recursive)
     if not files:
         print("No HTML files found.")
         return 0
 
-    processed = 0
+    opts = dict(
+        input_dir=input_dir,
+        include_urls=include_urls,
+        drop_tags=drop_tags,
+        strip_angle_buttons=strip_angle_buttons,
+        encoding=encoding,
+        strip_numbers=strip_numbers,
+        output_dir=output_dir,
+    )
+    # Sources sharing a stem (x.htm, x.html) map to the same x.txt. Workers
+    # would race on it, so keep only the last one in sorted order, which is
+    # the file a serial run leaves behind.
+    prefix = _rel_prefix(input_dir)
+    by_dst = {}
     for src in files:
-        rel = os.path.relpath(src, input_dir)
-        rel_noext = os.path.splitext(rel)[0]
-        dst = os.path.join(output_dir, rel_noext + ".txt")
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
-        try:
-            with open(src, "r", encoding=encoding, errors="replace") as f:
-                html = f.read()
-            text = html_to_text(html, include_urls=include_urls, drop_tags=drop_tags, strip_angle_buttons=strip_angle_buttons)
-            if strip_numbers:
-                text = strip_leading_numbers(text)
-            with open(dst, "w", encoding="utf-8", errors="replace") as f:
-                f.write(text)
+        by_dst[os.path.splitext(src[len(prefix):])[0]] = src
+    kept = set(by_dst.values())
+    for src in files:
+        if src not in kept:
+            winner = by_dst[os.path.splitext(src[len(prefix):])[0]]
+            print(f"Skipping {src}: same output as {winner}", file=sys.stderr)
+    files = [src for src in files if src in kept]
+
+    processed = 0
+    for idx, _, _, err in _run_pool(files, opts, workers):
+        if err is not None:
+            print(f"Error processing {files[idx]}: {err}", file=sys.stderr)
+        else:
             processed += 1
-        except Exception as e:
-            print(f"Error processing {src}: {e}", file=sys.stderr)
     return processed
 
 
@@ -592,6 +978,14 @@ def main(argv: Optional[List[str]] = None) -> int:
         help="Do not insert '===== <file> =====' headers in the merged file",
     )
 
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Worker processes for conversion (default: CPU count; 1 disables multiprocessing)",
+    )
+
     args = p.parse_args(argv)
     input_dir = os.path.abspath(args.input_dir)
     output_dir = (
@@ -618,6 +1012,7 @@ def main(argv: Optional[List[str]] = None) -> int:
             exts=exts,
             include_headers=not args.no_section_headers,
             strip_numbers=args.strip_leading_numbers,
+            workers=args.jobs,
         )
         print(f"Converted {count} file(s) → {os.path.abspath(single_path)}")
     else:
@@ -632,6 +1027,7 @@ def main(argv: Optional[List[str]] = None) -> int:
                 recursive=args.recursive,
                 exts=exts,
                 strip_numbers=args.strip_leading_numbers,
+                workers=args.jobs,
             )
             print(f"Converted {count} file(s) → {output_dir}")
 
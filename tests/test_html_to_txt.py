@@ -0,0 +1,102 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts", "convert"))
+
+import html_to_txt  # noqa: E402
+
+
+class HtmlToTextTest(unittest.TestCase):
+    def test_entities_are_decoded_once(self):
+        self.assertEqual(html_to_txt.html_to_text("<p>a&amp;lt;b</p>"), "a&lt;b\n")
+
+    def test_strip_arrows_line_drops_standalone_arrow_tokens(self):
+        self.assertEqual(html_to_txt.strip_arrows_line("• < x >> y"), "• x y")
+        self.assertEqual(html_to_txt.strip_arrows_line("• < (ROM16.htm)"), "• (ROM16.htm)")
+
+
+class HtmlFileToTextTest(unittest.TestCase):
+    def _write(self, content: bytes) -> str:
+        fd, path = tempfile.mkstemp(suffix=".html")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_small_chunks_match_whole_document(self):
+        # "á" occupies bytes 4-5, straddling the first 5-byte chunk boundary
+        html = "<p>aárbol con ñandú</p><p>texto largo sin etiquetas &amp; más</p><b>x</b>y"
+        self.assertEqual(html.encode("utf-8")[4:6], "á".encode("utf-8"))
+        path = self._write(html.encode("utf-8"))
+        self.assertEqual(
+            html_to_txt.html_file_to_text(path, chunk_size=5),
+            html_to_txt.html_to_text(html),
+        )
+
+    def test_decode_error_on_mmapped_file_is_not_masked(self):
+        # Files over chunk_size are mmapped; a failing decode must surface
+        # as itself, not as a BufferError from closing the mapping.
+        path = self._write(b"<p>" + b"a" * (70 * 1024) + b"</p>")
+        self.assertGreater(os.path.getsize(path), 65536)
+        with self.assertRaises(UnicodeError) as cm:
+            html_to_txt.html_file_to_text(path, encoding="idna")
+        self.assertNotIsInstance(cm.exception, BufferError)
+
+
+class ProcessAllTest(unittest.TestCase):
+    def test_sources_sharing_a_stem_keep_last_in_sorted_order(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            with open(os.path.join(src, "x.htm"), "w", encoding="utf-8") as f:
+                f.write("<p>" + "long " * 200000 + "</p>")
+            with open(os.path.join(src, "x.html"), "w", encoding="utf-8") as f:
+                f.write("<p>short</p>")
+            with contextlib.redirect_stderr(io.StringIO()) as err:
+                count = html_to_txt.process_all(
+                    src, dst, False, [], False, "utf-8", False, ["htm", "html"], workers=2
+                )
+            self.assertEqual(count, 1)
+            self.assertIn("x.htm", err.getvalue())
+            with open(os.path.join(dst, "x.txt"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "short\n")
+
+
+class MergeTxtFilesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        with open(os.path.join(self.root, "a.txt"), "wb") as f:
+            f.write(b"a\n\n\n")
+        with open(os.path.join(self.root, "b.txt"), "wb"):
+            pass
+        self.expected = b"===== a.txt =====\na\n\n===== b.txt =====\n\n"
+
+    def _merge(self, dest: str) -> bytes:
+        html_to_txt.merge_txt_files(self.root, dest)
+        with open(dest, "rb") as f:
+            return f.read()
+
+    def test_trailing_newlines_trimmed_and_empty_file_kept(self):
+        with tempfile.TemporaryDirectory() as out:
+            self.assertEqual(self._merge(os.path.join(out, "all.txt")), self.expected)
+
+    def test_dest_under_src_root_is_not_merged_into_itself(self):
+        dest = os.path.join(self.root, "zz_all.txt")
+        self._merge(dest)
+        # Second run sees the previous merge under src_root and must skip it
+        self.assertEqual(self._merge(dest), self.expected)
+
+    def test_falls_back_when_sendfile_fails(self):
+        with tempfile.TemporaryDirectory() as out, \
+                mock.patch.object(html_to_txt.os, "sendfile", side_effect=OSError, create=True) as sendfile:
+            self.assertEqual(self._merge(os.path.join(out, "all.txt")), self.expected)
+        self.assertTrue(sendfile.called)
+
+
+if __name__ == "__main__":
+    unittest.main()